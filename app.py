@@ -1,19 +1,80 @@
+import re
 import json
-import requests
+import time
+import uuid
+import httpx
 import streamlit as st
-from db import ClinicDB
+from db import ClinicDB, apply_pragmas
 from agno.agent import Agent
 from datetime import datetime
 from bs4 import BeautifulSoup
 from agno.tools.sql import SQLTools
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from agno.models.openai import OpenAIChat
+from agno.run.response import RunEvent
+from agno.storage.sqlite import SqliteStorage
 from agno.tools.duckduckgo import DuckDuckGoTools 
+from itertools import islice
+
+try:
+    # C (Lexbor) HTML parser for billing pages; BeautifulSoup is the pure-Python fallback
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
 
-# Initialize Database
-db = ClinicDB()
 db_url = "sqlite:///clinic.db"
-engine = create_engine(db_url)
+
+# Streamlit re-executes this script on every interaction, so long-lived objects
+# are created once per process and shared across reruns and sessions
+@st.cache_resource(show_spinner=False)
+def get_db():
+    return ClinicDB()
+
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    # The default QueuePool hands pooled connections to concurrent sessions; each new one
+    # gets the same WAL/cache PRAGMAs as ClinicDB so sql_helper reads never wait on a booking commit
+    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: apply_pragmas(dbapi_connection))
+    return engine
+
+@st.cache_resource(show_spinner=False)
+def get_http_client():
+    # One client per process: keeps connections to dr-bill.ca alive, retries failed connects
+    # and bounds how long a billing lookup can block the Streamlit thread
+    return httpx.Client(
+        timeout=httpx.Timeout(5.0, connect=2.0),
+        transport=httpx.HTTPTransport(retries=2),
+        follow_redirects=True
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_openai_http_client():
+    # Every session builds its own model, and OpenAIChat opens a fresh OpenAI client per
+    # run; sharing one connection pool keeps those cheap. Timeouts match the OpenAI SDK's
+    return httpx.Client(timeout=httpx.Timeout(600.0, connect=5.0))
+
+# Initialize Database
+db = get_db()
+engine = get_engine()
+
+BILLING_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# sql_helper only runs read-only queries and caps how many rows it materializes
+READ_ONLY_SQL = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+SQL_RESULT_LIMIT = 10000
+# Quoted strings and identifiers, comments, or any other single token; used to find where the
+# statement really ends without mistaking a ; or -- inside a literal for its end
+SQL_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)|\s+|.""", re.DOTALL)
+
+def strip_sql_terminator(query: str) -> str:
+    """Drop trailing semicolons, comments and whitespace so the query can be wrapped as a subquery"""
+    end = 0
+    for token in SQL_TOKEN.finditer(query):
+        piece = token.group()
+        if piece != ";" and not piece.isspace() and not piece.startswith(("--", "/*")):
+            end = token.end()
+    return query[:end]
 
 # Define Custom Tools
 class FindDoctorsInClinicTool:
@@ -22,20 +83,11 @@ class FindDoctorsInClinicTool:
     name = "find_doctors_in_clinic"
     description = "Checks if a doctor with a given name or specialty exists in our clinic's *internal database*. Use this AFTER attempting a general search for doctors."
     def run(self, search_query: str):
-        doctors = self.db.get_doctors()
-        results = []
         if search_query.isdigit():
-            for doc in doctors:
-                if doc['id'] == int(search_query):
-                    results.append(doc)
+            doctor = self.db.get_doctor_by_id(int(search_query))
+            results = [doctor] if doctor else []
         else:
-            search_lower = search_query.lower()
-            for doc in doctors:
-                full_name = f"{doc['first_name']} {doc['last_name']}".lower()
-                if (search_lower in full_name or
-                    search_lower in doc['specialty'].lower() or
-                    search_lower in f"dr. {doc['last_name']}".lower()):
-                    results.append(doc)
+            results = self.db.search_doctors(search_query)
         
         if not results:
             return {"message": f"No doctors matching '{search_query}' found in *our clinic's database*.", "doctors_found": []}
@@ -49,9 +101,7 @@ class GetAvailabilityTool:
     description = "Get available appointment slots for a specific doctor (by ID) on a specific date (format: YYYY-MM-DD) *from our clinic's database*."
     def run(self, doctor_id: int, date: str):
         # Validate doctor_id exists in database
-        doctors = self.db.get_doctors()
-        doctor_exists = any(doc['id'] == doctor_id for doc in doctors)
-        if not doctor_exists:
+        if not self.db.doctor_exists(doctor_id):
             return {"error": f"Doctor with ID {doctor_id} not found in our clinic's database. I can only check availability for doctors registered with us."}
         
         # Validate date format
@@ -63,7 +113,7 @@ class GetAvailabilityTool:
         slots = self.db.get_available_slots(doctor_id, date)
         
         if slots:
-            formatted_slots = [datetime.strptime(slot, "%Y-%m-%d %H:%M").strftime("%a, %b %d %Y at %I:%M %p") for slot in slots]
+            formatted_slots = [datetime.fromisoformat(slot).strftime("%a, %b %d %Y at %I:%M %p") for slot in slots]
             return {
                 "doctor_id": doctor_id,
                 "date": date,
@@ -88,62 +138,40 @@ class BookAppointmentTool:
         if patient_id is None:
             return {"error": "Patient ID is required to book an appointment."}
         
-        # Validate doctor_id exists in database
-        doctors = self.db.get_doctors()
-        doctor_exists = any(doc['id'] == doctor_id for doc in doctors)
-        if not doctor_exists:
+        # Validate doctor_id exists in database; the row is reused in the response
+        doctor_info = self.db.get_doctor_by_id(doctor_id)
+        if doctor_info is None:
             return {"error": f"Doctor with ID {doctor_id} not found in our clinic's database. I can only book appointments for doctors registered with us."}
             
-        # Validate patient_id exists in database
-        patient = self.db.get_patient_by_id(patient_id)
-        if not patient:
-            return {"error": f"Patient with ID {patient_id} not found in our database."}
-        
         try:
             # Parse the slot into datetime object
             slot_dt = datetime.strptime(slot, "%a, %b %d %Y at %I:%M %p")
-            
-            # Check if slot is actually available
-            date_str = slot_dt.strftime("%Y-%m-%d")
-            all_slots = self.db.get_available_slots(doctor_id, date_str)
-            if not all_slots:
-                return {"error": f"No available slots for doctor ID {doctor_id} on {date_str} in our clinic."}
-                
-            # Convert to same format for comparison
-            slot_db_format = slot_dt.strftime("%Y-%m-%d %H:%M")
-            if slot_db_format not in all_slots:
-                return {"error": f"The requested time slot is not available for doctor ID {doctor_id}."}
-            
-            # Book the appointment
+        except ValueError as e:
+            return {"error": f"Invalid time slot format: {slot}. Error: {str(e)}"}
+        
+        try:
+            # Validates patient, working hours and overlaps; the overlap check and insert share one transaction
             confirmation = self.db.book_appointment(
                 patient_id=patient_id,
                 doctor_id=doctor_id,
                 appointment_time=slot_dt.isoformat(),
                 is_emergency=emergency
             )
-            
-            # Get doctor info to include in response
-            doctor_info = None
-            for doc in doctors:
-                if doc['id'] == doctor_id:
-                    doctor_info = doc
-                    break
-            
-            # Format confirmation nicely
-            return {
-                "status": "success",
-                "confirmation_id": confirmation["id"],
-                "doctor": doctor_info,
-                "patient": patient,
-                "appointment_time": slot,
-                "is_emergency": emergency,
-                "message": f"Appointment successfully booked with Dr. {doctor_info['last_name']} on {slot}."
-            }
-            
         except ValueError as e:
-            return {"error": f"Invalid time slot format: {slot}. Error: {str(e)}"}
+            return {"error": f"Could not book the appointment with doctor ID {doctor_id} on {slot}: {str(e)}"}
         except Exception as e:
             return {"error": f"Failed to book appointment: {str(e)}"}
+        
+        # Format confirmation nicely
+        return {
+            "status": "success",
+            "confirmation_id": confirmation["confirmation_id"],
+            "doctor": doctor_info,
+            "patient": confirmation["patient"],
+            "appointment_time": slot,
+            "is_emergency": emergency,
+            "message": f"Appointment successfully booked with Dr. {doctor_info['last_name']} on {slot}."
+        }
 
 class HandleEmergencyTool:
     def __init__(self, db):
@@ -162,58 +190,87 @@ class HandleEmergencyTool:
         if not doctors:
             return {"error": f"No doctors specializing in '{specialty}' found in our clinic database."}
         
-        earliest_slot = None
-        selected_doctor = None
-        
-        for doctor in doctors:
-            slots = self.db.get_available_slots(doctor['id'], date)
-            if slots:
-                slots_dt = [datetime.strptime(s, "%Y-%m-%d %H:%M") for s in slots]
-                current_earliest = min(slots_dt)
-                if not earliest_slot or current_earliest < earliest_slot:
-                    earliest_slot = current_earliest
-                    selected_doctor = doctor
-        
-        if not earliest_slot:
+        earliest = self.db.get_earliest_slot_by_specialty(specialty, date)
+        if not earliest:
             return {
                 "error": f"No available emergency slots for {specialty} specialists on {date} in our clinic.",
                 "specialty": specialty,
                 "date": date,
                 "doctors_checked": len(doctors)
             }
-            
+        
+        earliest_slot = datetime.fromisoformat(earliest["slot"])
         return {
-            "doctor": selected_doctor,
+            "doctor": earliest["doctor"],
             "slot": earliest_slot.strftime("%a, %b %d %Y at %I:%M %p"),
             "specialty": specialty,
             "date": date
         }
 
 class BillingSearchTool:
+    def __init__(self, db, http):
+        self.db = db
+        self.http = http
     name = "search_billing_info"
     description = "Search for billing information on dr-bill.ca website using web search."
     def run(self, query: str):
-        
+        query = query.strip().lower()
+        url = f"https://www.dr-bill.ca/?s={query}" # Simple search query param example
+        cached = None
         try:
-            url = f"https://www.dr-bill.ca/?s={query}" # Simple search query param example
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            # Improved scraping: focus on article content or specific divs for relevance
-            # This is a very basic example; a real-world scraper would need more precise selectors
-            for element in soup.find_all(['p', 'h1', 'h2', 'h3', 'li']):
-                text = element.get_text().strip()
-                if query.lower() in text.lower() and len(text) > 50: # Avoid very short irrelevant snippets
-                    results.append(text)
+            cached = self.db.get_billing_cache_entry(query)
+            if cached and cached["fetched_at"] > time.time() - BILLING_CACHE_TTL:
+                results = cached["results"]
+            else:
+                results = self._scrape(url, query, cached)
             if not results:
                 return {"info": f"No detailed billing information found for '{query}' on dr-bill.ca. You might need to browse the site directly."}
             return {
-                "results": results[:3], # Limit results to top 3 relevant snippets
+                "results": results,
                 "source": url
             }
         except Exception as e:
+            # An expired entry is still better than nothing when the site is unreachable
+            if cached and cached["results"]:
+                return {
+                    "results": cached["results"],
+                    "source": url,
+                    "stale": True,
+                    "info": f"dr-bill.ca could not be reached ({str(e)}); these results are from an earlier search and may be out of date."
+                }
             return {"error": f"Failed to search billing information: {str(e)}. This might be a temporary issue or the website structure has changed."}
 
+    def _scrape(self, url: str, query: str, cached=None):
+        # Revalidate an expired cache entry so an unchanged page costs a 304 and no parsing
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        response = self.http.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            results = cached["results"]
+        else:
+            response.raise_for_status()
+            results = self._parse(response.text, query)
+        self.db.cache_billing(
+            query, results,
+            etag=response.headers.get("ETag", cached and cached["etag"]),
+            last_modified=response.headers.get("Last-Modified", cached and cached["last_modified"])
+        )
+        return results
+
+    def _parse(self, html: str, query: str):
+        # Improved scraping: focus on article content or specific divs for relevance
+        # This is a very basic example; a real-world scraper would need more precise selectors
+        if LexborHTMLParser is not None:
+            texts = (node.text().strip() for node in LexborHTMLParser(html).css('p, h1, h2, h3, li'))
+        else:
+            soup = BeautifulSoup(html, 'html.parser')
+            texts = (element.get_text().strip() for element in soup.find_all(['p', 'h1', 'h2', 'h3', 'li']))
+        # Avoid very short irrelevant snippets and stop at the top 3 relevant ones
+        return list(islice((text for text in texts if len(text) > 50 and query in text.lower()), 3))
+
 
 # SQLHelperTool remains useful for internal database schema introspection/queries
 class SQLHelperTool:
@@ -221,7 +278,7 @@ class SQLHelperTool:
         self.db = db
     name = "sql_helper"
     description = "Get schema information and run safe SQL queries on the internal clinic database."
-    def run(self, action: str = "schema", query: str = None):
+    def run(self, action: str = "schema", query: str = None, params: dict = None):
         if action == "schema":
             return {
                 "tables": {
@@ -232,13 +289,19 @@ class SQLHelperTool:
                 "message": "These are the tables and columns available in our *internal clinic database*. Use these exact column names in your SQL queries."
             }
         elif action == "query" and query:
+            if not READ_ONLY_SQL.match(query):
+                return {
+                    "success": False,
+                    "error": "Only read-only SELECT or WITH queries are allowed.",
+                    "message": "Rewrite the request as a SELECT query, or use the booking tools to change data."
+                }
             try:
-                results = []
+                # Wrapping the query as a subquery caps the row count and rejects
+                # anything that is not a single SELECT; values are bound via params
+                limited_query = f"SELECT * FROM ({strip_sql_terminator(query)}\n) LIMIT {SQL_RESULT_LIMIT}"
                 with engine.connect() as connection:
-                    result = connection.execute(query)
-                    keys = result.keys()
-                    for row in result:
-                        results.append(dict(zip(keys, row)))
+                    result = connection.execute(text(limited_query), params or {})
+                    results = [dict(row) for row in result.mappings()]
                 return {
                     "success": True,
                     "results": results,
@@ -253,19 +316,8 @@ class SQLHelperTool:
         else:
             return {"error": "Invalid action. Use 'schema' to get database schema or 'query' to run a SQL query."}
 
-# Create Tool Instances
-tools = [
-    FindDoctorsInClinicTool(db), # Renamed and re-purposed
-    GetAvailabilityTool(db),
-    BookAppointmentTool(db),
-    HandleEmergencyTool(db),
-    BillingSearchTool(),
-    SQLHelperTool(db), 
-    DuckDuckGoTools()
-]
-
 # Define Agent Instructions with improved clarity and context awareness
-instructions = """
+INSTRUCTIONS = """
 You are DocSplain, an intelligent medical appointment assistant. Follow these guidelines strictly:
 
 1.  **Your Primary Goal**: Assist patients in finding doctors and booking appointments. Always strive to provide helpful information and clear next steps. **NEVER respond with "None" or vague, unhelpful statements.**
@@ -289,7 +341,7 @@ You are DocSplain, an intelligent medical appointment assistant. Follow these gu
     * `book_appointment(doctor_id: int, slot: str, emergency: bool, patient_id: int)`: Use this only for doctors confirmed to be in our clinic's database and with a valid time slot. Requires the patient_id from the session.
     * `handle_emergency(specialty: str, date: str)`: Use for finding the earliest available emergency appointment *within our clinic* for a given specialty. The date *must* be in YYYY-MM-DD format.
     * `search_billing_info(query: str)`: Use for inquiries about billing information on dr-bill.ca.
-    * `sql_helper(action: str, query: str)`: Use this only for internal database schema inspection or safe SQL queries *if absolutely necessary* for a specific, complex internal data lookup that the other tools don't cover. Prioritize the higher-level tools.
+    * `sql_helper(action: str, query: str, params: dict)`: Use this only for internal database schema inspection or safe read-only SELECT queries (pass values as `:name` placeholders in `query` with a matching `params` dict) *if absolutely necessary* for a specific, complex internal data lookup that the other tools don't cover. Prioritize the higher-level tools.
 
 5.  **Time Slot Handling**:
     * ALWAYS use the exact time slot format returned by `get_doctor_availability`.
@@ -319,14 +371,69 @@ You are DocSplain, an intelligent medical appointment assistant. Follow these gu
 
 """
 
-# Create Agno Agent
-agent = Agent(
-    model=OpenAIChat(id="gpt-4.1-mini"),
-    tools=tools,
-    instructions=instructions,
-    show_tool_calls=True,
-    markdown=True
-)
+# Create Tool Instances (singletons shared by every rerun and session)
+@st.cache_resource(show_spinner=False)
+def build_tools():
+    return [
+        FindDoctorsInClinicTool(db), # Renamed and re-purposed
+        GetAvailabilityTool(db),
+        BookAppointmentTool(db),
+        HandleEmergencyTool(db),
+        BillingSearchTool(db, get_http_client()),
+        SQLHelperTool(db), 
+        DuckDuckGoTools()
+    ]
+
+# Route each prompt to the tools it is likely to need so fewer tool schemas are sent per call;
+# prompts that match both or neither route get every tool
+BILLING_PROMPT = re.compile(r"bill|invoice|code|AHCIP|MSP|OHIP", re.IGNORECASE)
+BOOKING_PROMPT = re.compile(r"book|appointment|available|slot|emergency", re.IGNORECASE)
+BILLING_TOOLS = frozenset({"search_billing_info", "duckduckgo"})
+BOOKING_TOOLS = frozenset({"find_doctors_in_clinic", "get_doctor_availability", "book_appointment", "handle_emergency", "duckduckgo"})
+
+def select_tool_names(prompt: str):
+    is_billing = bool(BILLING_PROMPT.search(prompt))
+    is_booking = bool(BOOKING_PROMPT.search(prompt))
+    if is_billing and not is_booking:
+        return BILLING_TOOLS
+    if is_booking and not is_billing:
+        return BOOKING_TOOLS
+    return frozenset(tool.name for tool in build_tools())
+
+# Agno keeps the conversation in clinic.db and replays only the last few runs,
+# so each turn no longer re-sends the whole chat history. Sharing the app engine
+# gives its per-turn session writes the same WAL/synchronous=NORMAL settings
+@st.cache_resource(show_spinner=False)
+def get_agent_storage():
+    return SqliteStorage(table_name="sessions", db_engine=engine)
+
+# Create Agno Agent (one per browser session and tool subset)
+def build_agent(tool_names: frozenset):
+    return Agent(
+        model=OpenAIChat(id="gpt-4.1-mini", http_client=get_openai_http_client()),
+        tools=[tool for tool in build_tools() if tool.name in tool_names],
+        instructions=INSTRUCTIONS,
+        storage=get_agent_storage(),
+        add_history_to_messages=True,
+        num_history_runs=8,
+        show_tool_calls=True,
+        markdown=True
+    )
+
+# An Agent keeps its run, memory and session on the instance and its model keeps tool-call
+# state, so sharing one across sessions loses turns and can mix conversations; only the
+# tools, storage and instructions are process-wide
+def get_session_agent(tool_names: frozenset):
+    agents = st.session_state.agents
+    if tool_names not in agents:
+        agents[tool_names] = build_agent(tool_names)
+    return agents[tool_names]
+
+def stream_content(run_stream):
+    """Yield the text deltas of a streamed agent run, skipping tool-call and other events"""
+    for chunk in run_stream:
+        if chunk.event == RunEvent.run_response.value and isinstance(chunk.content, str):
+            yield chunk.content
 
 # Streamlit App Setup (remains largely the same)
 st.set_page_config(page_title="DocSplain - Medical Appointment Assistant", layout="centered")
@@ -339,13 +446,12 @@ if "patient_id" not in st.session_state:
     st.session_state.patient_id = None
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
-
-# Function to get patient ID by email
-def get_patient_id_by_email(email: str):
-    patient = db.get_patient_by_email(email)
-    if patient:
-        return patient['id']
-    return None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+if "patient_info" not in st.session_state:
+    st.session_state.patient_info = None
+if "agents" not in st.session_state:
+    st.session_state.agents = {}
 
 # --- Sidebar for Login ---
 with st.sidebar:
@@ -354,11 +460,11 @@ with st.sidebar:
         email = st.text_input("Enter your email:", key="sidebar_email_input")
         if st.button("Login", key="sidebar_login_button"):
             if email:
-                patient_id = get_patient_id_by_email(email)
-                if patient_id:
-                    st.session_state.patient_id = patient_id
+                patient_info = db.get_patient_by_email(email)
+                if patient_info:
+                    st.session_state.patient_id = patient_info['id']
+                    st.session_state.patient_info = patient_info # Reused on every rerun instead of re-querying
                     st.session_state.logged_in = True
-                    patient_info = db.get_patient_by_id(patient_id)
                     st.sidebar.success(f"Welcome, **{patient_info['first_name']}**!")
                     # Add initial welcome message to chat history if not already there
                     if not st.session_state.messages:
@@ -372,47 +478,53 @@ with st.sidebar:
             else:
                 st.sidebar.warning("Please enter your email.")
     else:
-        patient_info = db.get_patient_by_id(st.session_state.patient_id)
+        patient_info = st.session_state.patient_info
         st.write(f"Logged in as: **{patient_info['first_name']} {patient_info['last_name']}**")
         if st.button("Logout", key="sidebar_logout_button"):
             st.session_state.patient_id = None
+            st.session_state.patient_info = None
             st.session_state.logged_in = False
             st.session_state.messages = [] # Clear chat history on logout
+            st.session_state.session_id = str(uuid.uuid4()) # Start a fresh agent session
+            # Agno does not clear an agent's in-memory runs when the session_id changes, so the
+            # routed agents are dropped too and the next patient starts with empty memory
+            st.session_state.agents = {}
             st.experimental_rerun()
 
 # --- Main Chat Area ---
-if st.session_state.logged_in:
-    # Display Chat Messages
+# Conversation history, shared by both views
+def render_history():
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
 
+if st.session_state.logged_in:
+    # Display Chat Messages
+    render_history()
+
     # Chat Input and Agent Interaction
     if prompt := st.chat_input("How can I help with your appointment today?"):
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Pass the entire chat history to the agent for memory
-        chat_history = [{"role": m["role"], "parts": [m["content"]]} for m in st.session_state.messages]
-        
-        # Add additional context for the agent
-        with st.spinner("DocSplain is thinking..."):
+        # Add additional context for the agent; earlier turns come from the agent's session storage
+        # Stream the answer so tokens show up as they are generated
+        with st.chat_message("assistant"):
             try:
-                response = agent.run(
+                agent = get_session_agent(select_tool_names(prompt))
+                response_text = st.write_stream(stream_content(agent.run(
                     prompt, 
-                    chat_history=chat_history, 
+                    stream=True,
+                    session_id=st.session_state.session_id,
+                    user_id=str(st.session_state.patient_id),
                     patient_id=st.session_state.patient_id
-                ) 
-                
-                st.session_state.messages.append({"role": "assistant", "content": response.content})
-                with st.chat_message("assistant"):
-                    st.markdown(response.content)
+                )))
+                st.session_state.messages.append({"role": "assistant", "content": response_text})
             except Exception as e:
                 error_message = f"Sorry, I encountered an error: {str(e)}. Please try again."
                 st.session_state.messages.append({"role": "assistant", "content": error_message})
-                with st.chat_message("assistant"):
-                    st.markdown(error_message)
+                st.markdown(error_message)
 else:
     st.info("Please log in using the sidebar to start chatting and book appointments.")
     if not st.session_state.messages: # Add initial welcome message for unauthenticated users
@@ -421,6 +533,4 @@ else:
             "content": "Welcome to DocSplain! Please log in using the sidebar to begin booking medical appointments."
         })
     # Display initial welcome message to chat history if not logged in
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+    render_history()
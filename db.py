@@ -1,65 +1,388 @@
+import calendar
+import json
+import queue
+import string
 import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date as dt_date, datetime, timedelta, time as clock_time
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterator, List, Dict, Optional, Tuple
+
+# Applied to every connection: WAL lets readers proceed while a writer commits, and
+# the larger page cache plus memory-mapped I/O serve hot pages without read syscalls
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Table definitions, run as one script so SQLite parses the schema in a single call
+TABLES_SQL = '''
+CREATE TABLE IF NOT EXISTS patients
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     first_name TEXT,
+     last_name TEXT,
+     dob TEXT,
+     gender TEXT,
+     phone TEXT,
+     email TEXT UNIQUE,
+     insurance TEXT);
+
+CREATE TABLE IF NOT EXISTS doctors
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     first_name TEXT,
+     last_name TEXT,
+     specialty TEXT,
+     phone TEXT,
+     email TEXT,
+     office_location TEXT,
+     hourly_rate REAL);
+
+CREATE TABLE IF NOT EXISTS schedules
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     doctor_id INTEGER,
+     day_of_week TEXT,
+     start_time TEXT,
+     end_time TEXT,
+     is_available BOOLEAN,
+     FOREIGN KEY(doctor_id) REFERENCES doctors(id));
+
+-- appt_date is a date-only column so per-day appointment lookups can seek an index instead of scanning;
+-- start_ts/end_ts are the appointment's bounds in Unix seconds (the naive time read as UTC) for overlap tests
+CREATE TABLE IF NOT EXISTS appointments
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     patient_id INTEGER,
+     doctor_id INTEGER,
+     appointment_time TEXT,
+     duration INTEGER,
+     status TEXT,
+     is_emergency BOOLEAN,
+     appt_date TEXT GENERATED ALWAYS AS (substr(appointment_time, 1, 10)) VIRTUAL,
+     start_ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', appointment_time) AS INTEGER)) VIRTUAL,
+     end_ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', appointment_time) AS INTEGER) + duration * 60) VIRTUAL,
+     FOREIGN KEY(patient_id) REFERENCES patients(id),
+     FOREIGN KEY(doctor_id) REFERENCES doctors(id));
+
+-- Materialized availability: free 30-minute slots per doctor, filled lazily per
+-- (doctor, date) and recorded in open_slot_days once computed
+CREATE TABLE IF NOT EXISTS open_slots
+    (doctor_id INTEGER,
+     slot_time TEXT,
+     PRIMARY KEY(doctor_id, slot_time)) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS open_slot_days
+    (doctor_id INTEGER,
+     slot_date TEXT,
+     PRIMARY KEY(doctor_id, slot_date)) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS billing_cache
+    (query TEXT PRIMARY KEY,
+     results_json TEXT,
+     fetched_at INTEGER,
+     etag TEXT,
+     last_modified TEXT);
+'''
+
+# Indexes and triggers, run after column migrations so every referenced column exists
+INDEXES_SQL = '''
+-- Databases written before the overlap check worked can hold two bookings for one doctor at the
+-- same time, so a unique index cannot be built on them; booking relies on the overlap check under
+-- BEGIN IMMEDIATE instead, and databases that got the unique index lose it here
+DROP INDEX IF EXISTS idx_appointments_doctor_time;
+
+CREATE INDEX IF NOT EXISTS idx_appt_doctor_date
+    ON appointments(doctor_id, appt_date);
+
+-- Holds both bounds, so the booking conflict check reads end_ts from the index without touching rows
+CREATE INDEX IF NOT EXISTS idx_appt_doctor_span
+    ON appointments(doctor_id, start_ts, end_ts);
+
+-- Lookup-by-field indexes; patients.email is already covered by its UNIQUE constraint
+CREATE INDEX IF NOT EXISTS idx_doctors_specialty
+    ON doctors(specialty);
+
+CREATE INDEX IF NOT EXISTS idx_doctors_name
+    ON doctors(last_name, first_name);
+
+-- Case-insensitive name indexes for prefix searches, which LIKE semantics make case-insensitive
+CREATE INDEX IF NOT EXISTS idx_doctors_first_name_nocase
+    ON doctors(first_name COLLATE NOCASE);
+
+CREATE INDEX IF NOT EXISTS idx_doctors_last_name_nocase
+    ON doctors(last_name COLLATE NOCASE);
+
+CREATE INDEX IF NOT EXISTS idx_schedules_doctor_day
+    ON schedules(doctor_id, day_of_week, is_available);
+
+-- A booking removes every open slot it overlaps
+CREATE TRIGGER IF NOT EXISTS open_slots_after_booking AFTER INSERT ON appointments BEGIN
+    DELETE FROM open_slots
+    WHERE doctor_id = NEW.doctor_id
+    AND slot_time < strftime('%Y-%m-%dT%H:%M:%S', NEW.appointment_time, '+' || NEW.duration || ' minutes')
+    AND slot_time > strftime('%Y-%m-%dT%H:%M:%S', NEW.appointment_time, '-30 minutes');
+END;
+
+-- Freed slots may still overlap other bookings, so a removed appointment makes the
+-- doctor's day be recomputed on its next read
+CREATE TRIGGER IF NOT EXISTS open_slots_after_cancellation AFTER DELETE ON appointments BEGIN
+    DELETE FROM open_slots
+    WHERE doctor_id = OLD.doctor_id
+    AND slot_time >= date(OLD.appointment_time)
+    AND slot_time < date(OLD.appointment_time, '+1 day');
+    DELETE FROM open_slot_days
+    WHERE doctor_id = OLD.doctor_id AND slot_date = date(OLD.appointment_time);
+END;
+
+-- A moved or resized appointment frees its old day and may overlap differently on its new one,
+-- so both days are recomputed on their next read
+CREATE TRIGGER IF NOT EXISTS open_slots_after_reschedule
+AFTER UPDATE OF doctor_id, appointment_time, duration ON appointments BEGIN
+    DELETE FROM open_slots
+    WHERE doctor_id = OLD.doctor_id
+    AND slot_time >= date(OLD.appointment_time)
+    AND slot_time < date(OLD.appointment_time, '+1 day');
+    DELETE FROM open_slot_days
+    WHERE doctor_id = OLD.doctor_id AND slot_date = date(OLD.appointment_time);
+    DELETE FROM open_slots
+    WHERE doctor_id = NEW.doctor_id
+    AND slot_time >= date(NEW.appointment_time)
+    AND slot_time < date(NEW.appointment_time, '+1 day');
+    DELETE FROM open_slot_days
+    WHERE doctor_id = NEW.doctor_id AND slot_date = date(NEW.appointment_time);
+END;
+
+-- Working hours shape every materialized day of a doctor, so any schedule change drops them all
+CREATE TRIGGER IF NOT EXISTS open_slots_after_schedule_insert AFTER INSERT ON schedules BEGIN
+    DELETE FROM open_slots WHERE doctor_id = NEW.doctor_id;
+    DELETE FROM open_slot_days WHERE doctor_id = NEW.doctor_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS open_slots_after_schedule_update AFTER UPDATE ON schedules BEGIN
+    DELETE FROM open_slots WHERE doctor_id IN (OLD.doctor_id, NEW.doctor_id);
+    DELETE FROM open_slot_days WHERE doctor_id IN (OLD.doctor_id, NEW.doctor_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS open_slots_after_schedule_delete AFTER DELETE ON schedules BEGIN
+    DELETE FROM open_slots WHERE doctor_id = OLD.doctor_id;
+    DELETE FROM open_slot_days WHERE doctor_id = OLD.doctor_id;
+END;
+'''
+
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Prepared statements each connection keeps; the hot queries below are written once at
+# module level so every call reuses the same cached statement
+STATEMENT_CACHE_SIZE = 256
+
+SQL_GET_PATIENT_BY_ID = "SELECT * FROM patients WHERE id=?"
+
+SQL_GET_PATIENT_BY_EMAIL = "SELECT * FROM patients WHERE email=?"
+
+# Bounds are compared NOCASE so each half of the OR can seek a name index
+SQL_GET_DOCTORS_BY_NAME_PREFIX = '''
+SELECT * FROM doctors
+WHERE (first_name >= ? COLLATE NOCASE AND first_name < ? COLLATE NOCASE)
+OR (last_name >= ? COLLATE NOCASE AND last_name < ? COLLATE NOCASE)
+ORDER BY id
+'''
+
+# Reads a doctor's materialized day marker and its open slots in one query
+SQL_GET_OPEN_SLOTS = '''
+SELECT s.slot_time FROM open_slot_days d
+LEFT JOIN open_slots s
+ON s.doctor_id = d.doctor_id AND s.slot_time >= ? AND s.slot_time < ?
+WHERE d.doctor_id=? AND d.slot_date=?
+ORDER BY s.slot_time
+'''
+
+SQL_GET_EARLIEST_SLOT = '''
+SELECT doctor_id, MIN(slot_time) AS earliest
+FROM open_slots
+WHERE slot_time >= ? AND slot_time < ?
+AND doctor_id IN (SELECT id FROM doctors WHERE specialty=?)
+GROUP BY doctor_id
+ORDER BY earliest
+LIMIT 1
+'''
+
+# Integer range test on the appointment bounds, answered from idx_appt_doctor_span
+SQL_FIND_CONFLICT = '''
+SELECT 1 FROM appointments
+WHERE doctor_id=? AND start_ts < ? AND end_ts > ?
+LIMIT 1
+'''
+
+SQL_INSERT_APPOINTMENT = '''
+INSERT INTO appointments
+(patient_id, doctor_id, appointment_time, duration, status, is_emergency)
+VALUES (?, ?, ?, ?, ?, ?)
+RETURNING id
+'''
+
+SQL_GET_BILLING_CACHE = "SELECT results_json, fetched_at, etag, last_modified FROM billing_cache WHERE query=?"
+
+SQL_PUT_BILLING_CACHE = '''
+INSERT OR REPLACE INTO billing_cache (query, results_json, fetched_at, etag, last_modified)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+# Patient rows kept in memory; the oldest entry is dropped once this many are cached
+PATIENT_CACHE_SIZE = 256
+
+# Idle read-only connections kept for reuse; busier moments open extra ones and close them after
+READ_POOL_SIZE = 4
+
+def _seconds_of_day(value) -> int:
+    """Seconds since midnight of a datetime.time or datetime"""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+def _unix_seconds(value: datetime) -> int:
+    """Seconds since the epoch of a naive datetime read as UTC, matching SQLite's strftime('%s')"""
+    return calendar.timegm(value.timetuple())
+
+def apply_pragmas(conn):
+    """Apply SQLITE_PRAGMAS to a DB-API sqlite3 connection"""
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
 
 class ClinicDB:
     def __init__(self, db_path='clinic.db'):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # The single writer connection; _rw() serializes its use across threads
+        self.conn = self._connect(db_path)
+        self._write_lock = threading.RLock()
+        # Reads run on pooled read-only connections so they never wait on a write transaction.
+        # An in-memory database cannot be opened twice, so there reads share the writer
+        self._read_uri = None if db_path == ':memory:' else Path(db_path).resolve().as_uri() + '?mode=ro'
+        self._read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+        # Doctor caches are stamped with the version they were built against
+        self._doctors_version = 0
+        self._doctor_search_index = (-1, None)
+        self._doctor_by_id = (-1, {})
+        self._doctor_by_name = (-1, {})
+        self._specialties = (-1, [])
+        self._schedule_by_day = (-1, {})
+        self._fts_enabled = False
+        # The app never updates or deletes patients, so cached rows stay valid
+        self._patient_by_id = {}
         self._init_db()
+        # The doctors table is tiny and read on nearly every request, so every doctor lookup
+        # is answered from memory; load it now rather than on the first request
+        self._doctors_by_id()
     
+    def _connect(self, database: str, uri: bool = False) -> sqlite3.Connection:
+        """Open a connection with the clinic's row factory and pragmas"""
+        conn = sqlite3.connect(database, uri=uri, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        # Rows support both tuple unpacking and access by column name
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        return conn
+
+    @contextmanager
+    def _ro(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection from the pool, opening one if none is idle"""
+        if self._read_uri is None:
+            with self._rw() as conn:
+                yield conn
+            return
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(self._read_uri, uri=True)
+        try:
+            yield conn
+        finally:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def _rw(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer connection; one thread at a time may use it"""
+        with self._write_lock:
+            yield self.conn
+
+    def _one(self, sql: str, params: Tuple) -> Optional[Dict]:
+        """Run a read query and return its first row as a dict, or None"""
+        with self._ro() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
     def _init_db(self):
         """Initialize database tables with proper doctor names and specialties"""
         c = self.conn.cursor()
         
         # Create tables
-        c.execute('''CREATE TABLE IF NOT EXISTS patients
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      first_name TEXT,
-                      last_name TEXT,
-                      dob TEXT,
-                      gender TEXT,
-                      phone TEXT,
-                      email TEXT UNIQUE,
-                      insurance TEXT)''')
+        c.executescript(TABLES_SQL)
         
-        c.execute('''CREATE TABLE IF NOT EXISTS doctors
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      first_name TEXT,
-                      last_name TEXT,
-                      specialty TEXT,
-                      phone TEXT,
-                      email TEXT,
-                      office_location TEXT,
-                      hourly_rate REAL)''')
+        # Databases created by an older schema lack these columns; the indexes below need the appointment ones
+        self._add_column_if_missing(c, "appointments", "appt_date",
+                                    "TEXT GENERATED ALWAYS AS (substr(appointment_time, 1, 10)) VIRTUAL")
+        self._add_column_if_missing(c, "appointments", "start_ts",
+                                    "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', appointment_time) AS INTEGER)) VIRTUAL")
+        self._add_column_if_missing(c, "appointments", "end_ts",
+                                    "INTEGER GENERATED ALWAYS AS "
+                                    "(CAST(strftime('%s', appointment_time) AS INTEGER) + duration * 60) VIRTUAL")
+        self._add_column_if_missing(c, "billing_cache", "etag", "TEXT")
+        self._add_column_if_missing(c, "billing_cache", "last_modified", "TEXT")
         
-        c.execute('''CREATE TABLE IF NOT EXISTS schedules
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      doctor_id INTEGER,
-                      day_of_week TEXT,
-                      start_time TEXT,
-                      end_time TEXT,
-                      is_available BOOLEAN,
-                      FOREIGN KEY(doctor_id) REFERENCES doctors(id))''')
+        c.executescript(INDEXES_SQL)
         
-        c.execute('''CREATE TABLE IF NOT EXISTS appointments
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      patient_id INTEGER,
-                      doctor_id INTEGER,
-                      appointment_time TEXT,
-                      duration INTEGER,
-                      status TEXT,
-                      is_emergency BOOLEAN,
-                      FOREIGN KEY(patient_id) REFERENCES patients(id),
-                      FOREIGN KEY(doctor_id) REFERENCES doctors(id))''')
+        self._init_doctor_search(c)
+        
+        self.conn.commit()
         
         # Insert sample data if tables are empty
         if not c.execute("SELECT COUNT(*) FROM patients").fetchone()[0]:
             self._insert_sample_data(c)
-        
-        self.conn.commit()
     
+    def _add_column_if_missing(self, cursor, table: str, column: str, definition: str):
+        """Add a column to an existing table, for databases created by an older schema"""
+        # table_xinfo (unlike table_info) also lists generated columns
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_xinfo({table})").fetchall()]
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _init_doctor_search(self, cursor):
+        """Create the trigram full-text index over doctors and the triggers that keep it in sync"""
+        try:
+            cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS doctors_fts
+                              USING fts5(name, specialty, dr_name, tokenize='trigram')''')
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+            return
+        self._fts_enabled = True
+        
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS doctors_fts_insert AFTER INSERT ON doctors BEGIN
+                            INSERT INTO doctors_fts (rowid, name, specialty, dr_name)
+                            VALUES (NEW.id, NEW.first_name || ' ' || NEW.last_name, NEW.specialty, 'dr. ' || NEW.last_name);
+                          END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS doctors_fts_delete AFTER DELETE ON doctors BEGIN
+                            DELETE FROM doctors_fts WHERE rowid = OLD.id;
+                          END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS doctors_fts_update AFTER UPDATE ON doctors BEGIN
+                            DELETE FROM doctors_fts WHERE rowid = OLD.id;
+                            INSERT INTO doctors_fts (rowid, name, specialty, dr_name)
+                            VALUES (NEW.id, NEW.first_name || ' ' || NEW.last_name, NEW.specialty, 'dr. ' || NEW.last_name);
+                          END''')
+        
+        # Index doctors that existed before the full-text table was created
+        cursor.execute('''INSERT INTO doctors_fts (rowid, name, specialty, dr_name)
+                          SELECT id, first_name || ' ' || last_name, specialty, 'dr. ' || last_name
+                          FROM doctors
+                          WHERE id NOT IN (SELECT rowid FROM doctors_fts)''')
+
     def _insert_sample_data(self, cursor):
-        """Insert sample data with realistic doctor names and specialties"""
+        """Insert sample data with realistic doctor names and specialties in one transaction"""
+        cursor.execute("BEGIN")
+        
         # Insert sample patients
         patients = [
             ("John", "Doe", "1985-05-15", "M", "555-0101", "john.doe@email.com", "BlueCross"),
@@ -102,175 +425,343 @@ class ClinicDB:
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
         time_slots = [("09:00", "12:00"), ("13:00", "17:00")]
         
-        for doctor_id in doctor_ids:
-            for day in days:
-                for start, end in time_slots:
-                    cursor.execute('''INSERT INTO schedules 
-                                      (doctor_id, day_of_week, start_time, end_time, is_available)
-                                      VALUES (?, ?, ?, ?, ?)''',
-                                      (doctor_id, day, start, end, True))
+        schedule_rows = [(doctor_id, day, start, end, True)
+                         for doctor_id in doctor_ids
+                         for day in days
+                         for start, end in time_slots]
+        cursor.executemany('''INSERT INTO schedules 
+                              (doctor_id, day_of_week, start_time, end_time, is_available)
+                              VALUES (?, ?, ?, ?, ?)''', schedule_rows)
+        self._invalidate_caches()
+        
+        self.conn.commit()
+
+    def _invalidate_caches(self):
+        """Invalidate cached doctor and schedule data; call after any write to the doctors or schedules tables"""
+        self._doctors_version += 1
+
+    def get_doctor_search_index(self) -> Tuple[List[str], List[Dict]]:
+        """Get doctor rows plus a parallel list of lowercased search haystacks, built once per write"""
+        version, index = self._doctor_search_index
+        if version != self._doctors_version:
+            doctors = self.get_doctors()
+            # One substring test per doctor covers full name, specialty and "dr. <last name>";
+            # the "|" separators keep a match from spanning two fields
+            haystacks = [f"{doc['first_name']} {doc['last_name']}|{doc['specialty']}|dr. {doc['last_name']}".lower()
+                         for doc in doctors]
+            index = (haystacks, doctors)
+            self._doctor_search_index = (self._doctors_version, index)
+        return index
+
+    def _doctors_by_id(self) -> Dict[int, Dict]:
+        """Get the id -> doctor map, rebuilt only when the doctors table has changed"""
+        version, doctors_by_id = self._doctor_by_id
+        if version != self._doctors_version:
+            with self._ro() as conn:
+                rows = conn.execute("SELECT * FROM doctors ORDER BY id").fetchall()
+            doctors_by_id = {row['id']: dict(row) for row in rows}
+            self._doctor_by_id = (self._doctors_version, doctors_by_id)
+        return doctors_by_id
+
+    def _doctors_by_name(self) -> Dict[Tuple[str, str], Dict]:
+        """Get the (first_name, last_name) -> doctor map, rebuilt only when the doctors table has changed"""
+        version, doctors_by_name = self._doctor_by_name
+        if version != self._doctors_version:
+            doctors_by_name = {}
+            for doc in self._doctors_by_id().values():
+                # Like the old fetchone(), the lowest ID wins when two doctors share a name
+                doctors_by_name.setdefault((doc['first_name'], doc['last_name']), doc)
+            self._doctor_by_name = (self._doctors_version, doctors_by_name)
+        return doctors_by_name
+
+    def _schedule_map(self) -> Dict[Tuple[int, str], List[Tuple[clock_time, clock_time]]]:
+        """Get the (doctor_id, day_of_week) -> working hours map, with times already parsed"""
+        version, schedule_by_day = self._schedule_by_day
+        if version != self._doctors_version:
+            schedule_by_day = {}
+            with self._ro() as conn:
+                rows = conn.execute('''SELECT doctor_id, day_of_week, start_time, end_time
+                                       FROM schedules
+                                       WHERE is_available=1
+                                       ORDER BY doctor_id, day_of_week, start_time''').fetchall()
+            for doctor_id, day_of_week, start, end in rows:
+                schedule_by_day.setdefault((doctor_id, day_of_week), []).append(
+                    (clock_time.fromisoformat(start), clock_time.fromisoformat(end)))
+            self._schedule_by_day = (self._doctors_version, schedule_by_day)
+        return schedule_by_day
+
+    def doctor_exists(self, doctor_id: int) -> bool:
+        """Check whether a doctor with the given ID is registered in the clinic"""
+        return doctor_id in self._doctors_by_id()
+
+    def search_doctors(self, query: str) -> List[Dict]:
+        """Search doctors by substring of full name, specialty or "dr. <last name>", exact last-name matches first"""
+        query = query.strip().lower()
+        # The trigram index can only match substrings of three or more characters
+        if self._fts_enabled and len(query) >= 3:
+            with self._ro() as conn:
+                rows = conn.execute('''SELECT d.* FROM doctors_fts f
+                                       JOIN doctors d ON d.id = f.rowid
+                                       WHERE doctors_fts MATCH ?
+                                       ORDER BY CASE WHEN lower(d.last_name) = ? THEN 0 ELSE 1 END, f.rank''',
+                                       ('"' + query.replace('"', '""') + '"', query)).fetchall()
+            return [dict(row) for row in rows]
+        
+        haystacks, doctors = self.get_doctor_search_index()
+        return [doctors[i] for i, haystack in enumerate(haystacks) if query in haystack]
 
     def get_specialties(self) -> List[str]:
         """Get a list of unique specialties available in the clinic"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT DISTINCT specialty FROM doctors")
-        return [row[0] for row in cursor.fetchall()]
+        version, specialties = self._specialties
+        if version != self._doctors_version:
+            # Sorted, as SELECT DISTINCT returned them when it read idx_doctors_specialty
+            specialties = sorted({doc['specialty'] for doc in self._doctors_by_id().values()})
+            self._specialties = (self._doctors_version, specialties)
+        return specialties
 
     def get_doctor_by_name(self, first_name: str, last_name: str) -> Optional[Dict]:
         """Get a doctor by their exact first and last name"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM doctors WHERE first_name=? AND last_name=?", (first_name, last_name))
-        row = cursor.fetchone()
-        if row:
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        doctor = self._doctors_by_name().get((first_name, last_name))
+        return dict(doctor) if doctor else None
 
     def search_doctors_by_name(self, name_part: str) -> List[Dict]:
-        """Search for doctors by partial match on first or last name"""
-        cursor = self.conn.cursor()
-        search_term = f"%{name_part}%"
-        cursor.execute("SELECT * FROM doctors WHERE first_name LIKE ? OR last_name LIKE ?", (search_term, search_term))
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        """Search for doctors by partial match on first or last name; a trailing * or % matches a prefix"""
+        # NOCASE folds only ASCII letters, so the bounds are folded the same way before the
+        # last character is bumped; a bumped character must not land on an uppercase letter
+        prefix = name_part[:-1].translate(ASCII_LOWERCASE)
+        if name_part[-1:] in ("*", "%") and prefix[-1:].isalnum() and not any(c in prefix for c in "%_*"):
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            with self._ro() as conn:
+                rows = conn.execute(SQL_GET_DOCTORS_BY_NAME_PREFIX, (prefix, upper, prefix, upper)).fetchall()
+            return [dict(row) for row in rows]
+
+        # The name column holds "first last", so a term containing a space could match across
+        # the two names; those and terms shorter than a trigram keep the LIKE scan
+        if self._fts_enabled and len(name_part) >= 3 and " " not in name_part:
+            sql = '''SELECT d.* FROM doctors_fts f
+                     JOIN doctors d ON d.id = f.rowid
+                     WHERE doctors_fts MATCH ?
+                     ORDER BY d.id'''
+            params = ('name : "' + name_part.replace('"', '""') + '"',)
+        else:
+            search_term = f"%{name_part}%"
+            sql = "SELECT * FROM doctors WHERE first_name LIKE ? OR last_name LIKE ? ORDER BY id"
+            params = (search_term, search_term)
+        with self._ro() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
 
     def get_patient_by_id(self, patient_id: int) -> Optional[Dict]:
         """Get patient by ID"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM patients WHERE id=?", (patient_id,))
-        row = cursor.fetchone()
-        if row:
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        patient = self._patient_by_id.get(patient_id)
+        if patient is not None:
+            # Copies, so a caller mutating the result cannot corrupt the shared cache
+            return dict(patient)
+        patient = self._one(SQL_GET_PATIENT_BY_ID, (patient_id,))
+        if patient:
+            self._cache_patient(patient)
+        return patient
+
+    def _cache_patient(self, patient: Dict):
+        """Remember a copy of a patient row for later ID lookups"""
+        if len(self._patient_by_id) >= PATIENT_CACHE_SIZE:
+            # Sessions evict concurrently, so another thread may already have removed the oldest key
+            self._patient_by_id.pop(next(iter(self._patient_by_id), None), None)
+        self._patient_by_id[patient['id']] = dict(patient)
 
     def get_doctor_by_id(self, doctor_id: int) -> Optional[Dict]:
         """Get doctor by ID"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM doctors WHERE id=?", (doctor_id,))
-        row = cursor.fetchone()
-        if row:
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        # Copies, so a caller mutating the result cannot corrupt the shared cache
+        doctor = self._doctors_by_id().get(doctor_id)
+        return dict(doctor) if doctor else None
 
     def get_patient_by_email(self, email: str) -> Optional[Dict]:
         """Get patient by email address"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM patients WHERE email=?", (email,))
-        row = cursor.fetchone()
-        if row:
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        patient = self._one(SQL_GET_PATIENT_BY_EMAIL, (email,))
+        if patient:
+            # Logging in by email is followed by ID lookups for the same patient
+            self._cache_patient(patient)
+        return patient
     
     def get_doctors(self, specialty: Optional[str] = None) -> List[Dict]:
         """Get list of doctors, optionally filtered by specialty"""
-        cursor = self.conn.cursor()
+        doctors = self._doctors_by_id().values()
         if specialty:
-            cursor.execute("SELECT * FROM doctors WHERE specialty=?", (specialty,))
-        else:
-            cursor.execute("SELECT * FROM doctors")
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [dict(doc) for doc in doctors if doc['specialty'] == specialty]
+        return [dict(doc) for doc in doctors]
     
     def get_available_slots(self, doctor_id: int, date: str) -> List[str]:
-        """Get available time slots for a doctor on a specific date, accounting for overlaps"""
-        cursor = self.conn.cursor()
-        target_day = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
-        cursor.execute('''SELECT start_time, end_time 
-                          FROM schedules 
-                          WHERE doctor_id=? AND day_of_week=? AND is_available=1''',
-                          (doctor_id, target_day))
-        working_hours = cursor.fetchall()
+        """Get available time slots for a doctor on a specific date, accounting for overlaps.
+
+        Slots are ISO-8601 strings in the same format as appointments.appointment_time.
+        """
+        date = self._normalize_date(date)
+        # No rows means the day has not been computed yet, a single NULL slot means it has no free slots
+        params = (date, self._next_date(date), doctor_id, date)
+        with self._ro() as conn:
+            rows = conn.execute(SQL_GET_OPEN_SLOTS, params).fetchall()
+        if not rows:
+            self._ensure_open_slots([doctor_id], date)
+            with self._ro() as conn:
+                rows = conn.execute(SQL_GET_OPEN_SLOTS, params).fetchall()
+        return [row[0] for row in rows if row[0] is not None]
+
+    def get_earliest_slot_by_specialty(self, specialty: str, date: str) -> Optional[Dict]:
+        """Find the earliest free slot across all doctors of a specialty on a date"""
+        date = self._normalize_date(date)
+        doctor_ids = [doc_id for doc_id, doc in self._doctors_by_id().items() if doc['specialty'] == specialty]
+        if not doctor_ids:
+            return None
+        self._ensure_open_slots(doctor_ids, date)
         
-        if not working_hours:
-            return []
-
-        # Get all appointments for the doctor on that date
-        cursor.execute('''SELECT appointment_time, duration 
-                          FROM appointments 
-                          WHERE doctor_id=? AND date(appointment_time)=?''',
-                          (doctor_id, date))
-        appointments = cursor.fetchall()
+        with self._ro() as conn:
+            row = conn.execute(SQL_GET_EARLIEST_SLOT, (date, self._next_date(date), specialty)).fetchone()
+        if row:
+            return {"doctor": self.get_doctor_by_id(row["doctor_id"]), "slot": row["earliest"]}
+        return None
+
+    def _normalize_date(self, date: str) -> str:
+        """Parse a date the way the tools validate it (so "2025-6-2" is accepted) and return it as YYYY-MM-DD.
+
+        The result is used as the open_slot_days key and the prefix of slot strings, so it must be zero-padded.
+        """
+        return datetime.strptime(date, "%Y-%m-%d").date().isoformat()
+
+    def _next_date(self, date: str) -> str:
+        """Get the day after a YYYY-MM-DD date, as an exclusive upper bound for slot times"""
+        return (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
+
+    def _ensure_open_slots(self, doctor_ids: List[int], date: str):
+        """Materialize the open slots of the given doctors on a date, unless that was already done.
+
+        Slots are computed once per (doctor, date) from schedules and appointments; after
+        that, triggers on appointments keep open_slots current.
+        """
+        placeholders = ",".join("?" * len(doctor_ids))
+        with self._ro() as conn:
+            rows = conn.execute(f"SELECT doctor_id FROM open_slot_days WHERE slot_date=? AND doctor_id IN ({placeholders})",
+                                (date, *doctor_ids)).fetchall()
+        missing = sorted(set(doctor_ids) - {row[0] for row in rows})
+        if not missing:
+            return
+
+        schedule_map = self._schedule_map()
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+        target_day = day.strftime("%A")
+        placeholders = ",".join("?" * len(missing))
+        with self._rw() as conn:
+            cursor = conn.cursor()
+            # Hold the write lock so no booking lands between reading appointments and storing slots
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Days before today can no longer be booked; dropping them keeps both tables
+                # from growing with every date ever queried
+                today = datetime.now().date().isoformat()
+                cursor.execute("DELETE FROM open_slots WHERE slot_time < ?", (today,))
+                cursor.execute("DELETE FROM open_slot_days WHERE slot_date < ?", (today,))
+
+                cursor.execute(f'''SELECT doctor_id, appointment_time, duration
+                                   FROM appointments
+                                   WHERE appt_date=? AND doctor_id IN ({placeholders})''',
+                               (date, *missing))
+                appointments = {}
+                for doctor_id, apt_time, duration in cursor.fetchall():
+                    appointments.setdefault(doctor_id, []).append((apt_time, duration))
+
+                open_slots = [(doctor_id, slot)
+                              for doctor_id in missing
+                              for slot in self._iter_free_slots(day, schedule_map.get((doctor_id, target_day), []),
+                                                                appointments.get(doctor_id, []))]
+                cursor.executemany("INSERT OR IGNORE INTO open_slots (doctor_id, slot_time) VALUES (?, ?)", open_slots)
+                cursor.executemany("INSERT OR IGNORE INTO open_slot_days (doctor_id, slot_date) VALUES (?, ?)",
+                                   [(doctor_id, date) for doctor_id in missing])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _iter_free_slots(self, day: dt_date, working_hours, appointments) -> Iterator[str]:
+        """Yield, in order, the 30-minute slots within working hours that no appointment overlaps"""
+        # All arithmetic is in integer seconds since midnight of the date, which unlike POSIX
+        # timestamps needs no timezone; datetimes are parsed once per appointment, never per slot
+        slot_length = 30 * 60
+        # Built from the parsed date so slots always carry a zero-padded YYYY-MM-DD prefix
+        slot_prefix = day.isoformat()
         appointment_intervals = []
         for apt_time, duration in appointments:
-            start = datetime.fromisoformat(apt_time)
-            end = start + timedelta(minutes=duration)
-            appointment_intervals.append((start, end))
+            start = _seconds_of_day(datetime.fromisoformat(apt_time))
+            appointment_intervals.append((start, start + duration * 60))
+        appointment_intervals.sort()
+        # starts[i] pairs with the latest end among the first i + 1 appointments, so one bisect
+        # finds the appointments starting before a slot ends and one comparison tells whether
+        # any of them is still running when it begins
+        starts = [start for start, _ in appointment_intervals]
+        latest_ends = list(accumulate((end for _, end in appointment_intervals), max))
 
-        available_slots = []
         for work_start, work_end in working_hours:
-            work_start_dt = datetime.strptime(f"{date} {work_start}", "%Y-%m-%d %H:%M")
-            work_end_dt = datetime.strptime(f"{date} {work_end}", "%Y-%m-%d %H:%M")
-            current = work_start_dt
-            while current + timedelta(minutes=30) <= work_end_dt:
-                slot_end = current + timedelta(minutes=30)
-                overlaps = any(
-                    max(current, apt_start) < min(slot_end, apt_end)
-                    for apt_start, apt_end in appointment_intervals
-                )
-                if not overlaps:
-                    available_slots.append(current.strftime("%Y-%m-%d %H:%M"))
-                current += timedelta(minutes=30)
-        
-        return available_slots
+            for current in range(_seconds_of_day(work_start), _seconds_of_day(work_end) - slot_length + 1, slot_length):
+                # With no appointments, or none starting before the slot ends, i is -1
+                i = bisect_left(starts, current + slot_length) - 1
+                if i < 0 or latest_ends[i] <= current:
+                    yield f"{slot_prefix}T{current // 3600:02d}:{current // 60 % 60:02d}:{current % 60:02d}"
     
     def book_appointment(self, patient_id: int, doctor_id: int, 
                          appointment_time: str, duration: int = 30, 
                          is_emergency: bool = False) -> Dict:
-        """Book an appointment with validation and return confirmation details"""
-        cursor = self.conn.cursor()
-        
-        # Validate patient and doctor existence
-        if not self.get_patient_by_id(patient_id):
+        """Book an appointment with validation and return confirmation details.
+
+        The overlap check and insert run in one write transaction, so two sessions cannot
+        both pass the check and book the same slot.
+        """
+        appointment_dt = datetime.fromisoformat(appointment_time)
+        end_dt = appointment_dt + timedelta(minutes=duration)
+
+        # Patients and doctors are never removed and working hours come from the cached
+        # schedule map, so these checks run before taking the write lock; the rows they
+        # fetch are the ones the confirmation is built from
+        patient = self.get_patient_by_id(patient_id)
+        if patient is None:
             raise ValueError("Patient not found.")
-        if not self.get_doctor_by_id(doctor_id):
+        doctor = self.get_doctor_by_id(doctor_id)
+        if doctor is None:
             raise ValueError("Doctor not found.")
 
-        # Check if appointment time is within working hours
-        appointment_dt = datetime.fromisoformat(appointment_time)
+        # Check if the appointment fits within working hours
         day_of_week = appointment_dt.strftime("%A")
-        cursor.execute('''SELECT start_time, end_time 
-                          FROM schedules 
-                          WHERE doctor_id=? AND day_of_week=? AND is_available=1''',
-                          (doctor_id, day_of_week))
-        schedules = cursor.fetchall()
-        is_within_schedule = False
-        for start, end in schedules:
-            schedule_start = datetime.strptime(f"{appointment_dt.date()} {start}", "%Y-%m-%d %H:%M")
-            schedule_end = datetime.strptime(f"{appointment_dt.date()} {end}", "%Y-%m-%d %H:%M")
-            if schedule_start <= appointment_dt < schedule_end:
-                is_within_schedule = True
+        schedule_start = None
+        for start, end in self._schedule_map().get((doctor_id, day_of_week), []):
+            block_start = datetime.combine(appointment_dt.date(), start)
+            block_end = datetime.combine(appointment_dt.date(), end)
+            if block_start <= appointment_dt and end_dt <= block_end:
+                schedule_start = block_start
                 break
-        if not is_within_schedule:
+        if schedule_start is None:
             raise ValueError("The selected time is outside the doctor's working hours.")
+        # Only the 30-minute slots offered by get_available_slots can be booked; an off-grid
+        # start would straddle two slots and take both out of open_slots
+        if (appointment_dt - schedule_start) % timedelta(minutes=30):
+            raise ValueError("The selected time is not one of the doctor's available slots.")
 
-        # Check for overlapping appointments
-        start_dt = appointment_dt
-        end_dt = start_dt + timedelta(minutes=duration)
-        cursor.execute('''SELECT COUNT(*) FROM appointments
-                          WHERE doctor_id=?
-                          AND appointment_time < ?
-                          AND datetime(appointment_time, '+' || duration || ' minutes') > ?''',
-                          (doctor_id, end_dt.isoformat(), start_dt.isoformat()))
-        if cursor.fetchone()[0] > 0:
-            raise ValueError("The selected time slot is not available.")
-
-        # Insert appointment
-        cursor.execute('''INSERT INTO appointments 
-                          (patient_id, doctor_id, appointment_time, duration, status, is_emergency)
-                          VALUES (?, ?, ?, ?, ?, ?)''',
-                          (patient_id, doctor_id, appointment_time, duration, "Confirmed", is_emergency))
-        
-        # Get details for confirmation
-        patient = self.get_patient_by_id(patient_id)
-        doctor = self.get_doctor_by_id(doctor_id)
-        
-        self.conn.commit()
+        with self._rw() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Check for overlapping appointments
+                cursor.execute(SQL_FIND_CONFLICT, (doctor_id, _unix_seconds(end_dt), _unix_seconds(appointment_dt)))
+                if cursor.fetchone() is not None:
+                    raise ValueError("The selected time slot is not available.")
+
+                # Insert appointment; the write lock held since the overlap check keeps the slot free
+                cursor.execute(SQL_INSERT_APPOINTMENT,
+                               (patient_id, doctor_id, appointment_time, duration, "Confirmed", is_emergency))
+                inserted = cursor.fetchone()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
         
         return {
-            "confirmation_id": cursor.lastrowid,
+            "confirmation_id": inserted[0],
             "patient": {
                 "name": f"{patient['first_name']} {patient['last_name']}",
                 "contact": patient['phone'],
@@ -287,8 +778,29 @@ class ClinicDB:
             "is_emergency": is_emergency
         }
 
+    def get_billing_cache_entry(self, query: str) -> Optional[Dict]:
+        """Get cached billing search results with their fetch time and HTTP validators"""
+        with self._ro() as conn:
+            row = conn.execute(SQL_GET_BILLING_CACHE, (query,)).fetchone()
+        if row:
+            return {"results": json.loads(row["results_json"]), "fetched_at": row["fetched_at"],
+                    "etag": row["etag"], "last_modified": row["last_modified"]}
+        return None
+
+    def cache_billing(self, query: str, results: List[str],
+                      etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store billing search results and the page's HTTP validators for later lookups"""
+        with self._rw() as conn:
+            conn.execute(SQL_PUT_BILLING_CACHE, (query, json.dumps(results), int(time.time()), etag, last_modified))
+            conn.commit()
+
     def close(self):
-        """Close the database connection"""
+        """Close the writer and every idle pooled read connection"""
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
         self.conn.close()
 
 if __name__ == '__main__':